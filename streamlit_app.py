@@ -1,34 +1,77 @@
 import streamlit as st
+import bisect
 import os
 import datetime
-import pytz  # Library for timezone handling
+import uuid
+from zoneinfo import ZoneInfo  # Stdlib timezone handling
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, Text
+import pyarrow as pa
+from sqlalchemy import bindparam, create_engine, event, insert, lambda_stmt, select, Column, String, Integer, Float, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from io import BytesIO
+import atexit
+import collections
 import logging
-
-# Configure logging
-logging.basicConfig(
-    filename='app.log',
-    filemode='a',
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+import logging.handlers
+import queue
 
 logger = logging.getLogger()
 
+# Configure logging. Log records go onto an in-process queue and a single
+# background listener thread does the actual file writes, so hot paths
+# (add to cart, checkout) never block on disk I/O. The handler check keeps
+# Streamlit reruns from stacking duplicate handlers.
+if not logger.handlers:
+    _log_queue = queue.Queue(-1)
+    # Rotate so long-running deployments don't grow app.log without bound.
+    _file_handler = logging.handlers.RotatingFileHandler(
+        'app.log', mode='a', maxBytes=1_000_000, backupCount=3
+    )
+    _file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    _log_listener = logging.handlers.QueueListener(_log_queue, _file_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+# Receipt timestamps are reported in Hong Kong time; cache the zone object
+# once instead of re-resolving it per receipt.
+HK_TZ = ZoneInfo("Asia/Hong_Kong")
+
+# Static widget option lists, allocated once at import instead of per rerun.
+MENU_OPTIONS = ("View Products", "Add to Cart", "View Cart", "Checkout", "Manage Products", "View Receipts")
+MANAGE_SUBMENU = ("View Products", "Add Product", "Edit Product", "Delete Product")
+PAYMENT_METHODS = ("Cash", "PayMe", "支付寶", "轉數快")
+
 # Define the ORM base
 Base = declarative_base()
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply performance PRAGMAs on every new SQLite connection.
+
+    WAL journaling with synchronous=NORMAL makes commits append-only (one
+    fsync instead of two) and lets readers run concurrently with writers,
+    which matters because every receipt/product change commits immediately.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
 # Define the Receipt model
 class Receipt(Base):
     __tablename__ = 'receipts'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    receipt_id = Column(String, unique=True, nullable=False)
-    date = Column(DateTime, nullable=False)
+    receipt_id = Column(String, unique=True, nullable=False, index=True)
+    date = Column(DateTime, nullable=False, index=True)
     products = Column(Text, nullable=False)
     total_before_discounts = Column(Float, nullable=False)
     discounts_applied = Column(Text, nullable=True)
@@ -42,79 +85,141 @@ class Product(Base):
     __tablename__ = 'products'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, unique=True, nullable=False)
+    name = Column(String, unique=True, nullable=False, index=True)
     price = Column(Float, nullable=False)
     stock = Column(Integer, nullable=False)
 
+# Pre-built statements for hot lookup paths. lambda_stmt caches the compiled
+# SQL keyed on the lambda, so repeated reruns pay a dict lookup instead of a
+# fresh statement compilation.
+PRODUCT_BY_ID = lambda_stmt(lambda: select(Product).where(Product.id == bindparam("pid")))
+
+# The receipt INSERT never changes shape, so build the construct once and let
+# the dialect's compiled cache reuse it on every checkout.
+RECEIPT_INSERT = Receipt.__table__.insert()
+
+# One pass over the cart produces everything checkout and the receipt writers
+# need. rows holds (name, quantity, price, subtotal) tuples.
+CartSummary = collections.namedtuple("CartSummary", ["total_before", "products_summary", "rows"])
+
+# Package discounts. These rules are static, so the derived structures are
+# built once at import time rather than per Cashier instance.
+PACKAGES = [
+    {"name": "一袋一布帶", "required_products": {1: 1, 2: 1}, "discount": 10},
+    {"name": "兩布帶", "required_products": {1: 2}, "discount": 5},
+    {"name": "兩袋", "required_products": {2: 2}, "discount": 10},
+]
+
+# Package requirements as integer arrays so apply_package_discounts can run
+# on vectorized operations instead of nested dict loops. All product ids
+# referenced by any package share one availability vector indexed via
+# PACKAGE_INDICES.
+PACKAGE_PIDS = sorted({pid for p in PACKAGES for pid in p["required_products"]})
+_pid_pos = {pid: i for i, pid in enumerate(PACKAGE_PIDS)}
+PACKAGE_INDICES = [
+    np.array([_pid_pos[pid] for pid in p["required_products"]], dtype=np.int64)
+    for p in PACKAGES
+]
+PACKAGE_REQUIREMENTS = [
+    np.fromiter(p["required_products"].values(), dtype=np.int64)
+    for p in PACKAGES
+]
+
+# Fixed amount discounts, sorted once by threshold so apply_fixed_discount
+# can binary-search the highest tier the total clears.
+FIXED_DISCOUNTS = [
+    {"threshold": 220, "discount": 20},
+    {"threshold": 350, "discount": 40},
+]
+SORTED_DISCOUNTS = sorted(FIXED_DISCOUNTS, key=lambda d: d["threshold"])
+DISCOUNT_THRESHOLDS = [d["threshold"] for d in SORTED_DISCOUNTS]
+
 class Cashier:
     def __init__(self):
-        # Define package discounts
-        self.packages = [
-            {"name": "一袋一布帶", "required_products": {1: 1, 2: 1}, "discount": 10},
-            {"name": "兩布帶", "required_products": {1: 2}, "discount": 5},
-            {"name": "兩袋", "required_products": {2: 2}, "discount": 10},
-        ]
-
-        # Define fixed amount discounts
-        self.fixed_discounts = [
-            {"threshold": 220, "discount": 20},
-            {"threshold": 350, "discount": 40},
-        ]
-
         # Setup SQLite Database
         self.database_file = 'receipts.db'
         self.setup_database()
         
-        # Initialize default products if the products table is empty
-        if self.session.query(Product).count() == 0:
+        # Initialize default products if the products table is empty. A
+        # LIMIT 1 existence probe is enough here; no need to count the table.
+        # With the cached Cashier this runs once per process, not per rerun.
+        if self.session.execute(select(Product.id).limit(1)).first() is None:
             self.initialize_default_products()
 
     def setup_database(self):
         """Initialize the SQLite database and create tables if they don't exist."""
         try:
-            self.engine = create_engine(f'sqlite:///{self.database_file}', echo=False, connect_args={'check_same_thread': False})
+            # File-based SQLite defaults to NullPool, which reopens the
+            # database file (and its -wal/-shm companions) on every
+            # connection checkout. A small QueuePool keeps warm connections
+            # with their page cache and PRAGMAs already applied.
+            self.engine = create_engine(
+                f'sqlite:///{self.database_file}',
+                echo=False,
+                future=True,
+                poolclass=QueuePool,
+                pool_size=4,
+                max_overflow=8,
+                connect_args={'check_same_thread': False, 'timeout': 30},
+            )
+            event.listen(self.engine, "connect", set_sqlite_pragmas)
             Base.metadata.create_all(self.engine)
-            Session = sessionmaker(bind=self.engine)
-            self.session = Session()
-            st.success(f"Database '{self.database_file}' initialized successfully.")
+            # create_all skips tables that already exist, so databases from
+            # before the lookup columns were declared index=True never get
+            # the indexes; add them explicitly for those files.
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_receipts_receipt_id ON receipts (receipt_id)")
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_receipts_date ON receipts (date)")
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_products_name ON products (name)")
+            # A scoped registry instead of one process-lifetime Session: the
+            # proxy hands out a session on demand and close_session() at the
+            # end of each rerun returns it, keeping the identity map bounded
+            # to one rerun's worth of objects. expire_on_commit=False avoids
+            # refetching attributes that are rendered right after a commit.
+            self.Session = scoped_session(sessionmaker(bind=self.engine, expire_on_commit=False))
+            self.session = self.Session
             logger.info(f"Database '{self.database_file}' initialized successfully.")
         except Exception as e:
-            st.error(f"Error setting up the database: {e}")
+            # No Streamlit calls here: this runs inside the cache_resource
+            # factory, where UI side effects are discouraged. Let the caller
+            # decide how to surface the failure; an exception also keeps the
+            # broken Cashier out of the resource cache so reruns retry.
             logger.error(f"Error setting up the database: {e}")
-            st.stop()
-        
-        # Display absolute path for confirmation
-        abs_path = os.path.abspath(self.database_file)
-        # st.write(f"Database absolute path: {abs_path}")  # Removed from frontend
-        logger.info(f"Database absolute path: {abs_path}")
-        
-        # Display current working directory
-        cwd = os.getcwd()
-        # st.write(f"Current Working Directory: {cwd}")  # Removed from frontend
-        logger.info(f"Current Working Directory: {cwd}")
-        
-        # List directory contents
-        # st.write("#### Files in Current Directory:")  # Removed from frontend
-        dir_contents = os.listdir('.')
-        # st.write(dir_contents)  # Removed from frontend
-        logger.info(f"Directory Contents: {dir_contents}")
+            raise
+
+        # Debug snapshot of the environment. The directory listing is
+        # stat-heavy on containers with a crowded working directory, so only
+        # collect it when explicitly asked for.
+        if os.environ.get("CASHIER_DEBUG"):
+            logger.info(f"Database absolute path: {os.path.abspath(self.database_file)}")
+            logger.info(f"Current Working Directory: {os.getcwd()}")
+            logger.info(f"Directory Contents: {os.listdir('.')}")
+
+    def close_session(self):
+        """Return the current scoped session to the registry.
+
+        Called at the end of each Streamlit rerun so hydrated objects don't
+        accumulate across interactions.
+        """
+        self.Session.remove()
 
     def initialize_default_products(self):
         """Initialize the database with default products."""
         try:
             default_products = [
-                Product(name="布帶", price=30.0, stock=100),
-                Product(name="布袋", price=50.0, stock=100),
-                Product(name="字母 (大)", price=7.0, stock=200),
-                Product(name="字母 (小)", price=5.0, stock=200),
-                Product(name="圖案 (大)", price=15.0, stock=150),
-                Product(name="圖案 (中)", price=10.0, stock=150),
-                Product(name="圖案 (小)", price=5.0, stock=150),
-                Product(name="蚯蚓", price=20.0, stock=100),
+                {"name": "布帶", "price": 30.0, "stock": 100},
+                {"name": "布袋", "price": 50.0, "stock": 100},
+                {"name": "字母 (大)", "price": 7.0, "stock": 200},
+                {"name": "字母 (小)", "price": 5.0, "stock": 200},
+                {"name": "圖案 (大)", "price": 15.0, "stock": 150},
+                {"name": "圖案 (中)", "price": 10.0, "stock": 150},
+                {"name": "圖案 (小)", "price": 5.0, "stock": 150},
+                {"name": "蚯蚓", "price": 20.0, "stock": 100},
             ]
-            self.session.bulk_save_objects(default_products)
+            # Single batched INSERT (one round-trip, one commit/fsync) instead
+            # of the legacy per-row bulk_save_objects path.
+            self.session.execute(insert(Product), default_products)
             self.session.commit()
-            st.success("Default products initialized.")
             logger.info("Default products initialized in the database.")
         except Exception as e:
             st.error(f"Error initializing default products: {e}")
@@ -131,12 +236,29 @@ class Cashier:
             logger.error(f"Error retrieving products: {e}")
             return []
 
+    def invalidate_products_cache(self):
+        """Bump the products version counter so cached listings are refetched."""
+        st.session_state.products_version = st.session_state.get("products_version", 0) + 1
+        load_products.clear()
+        load_product_name_map.clear()
+        load_product_options.clear()
+        load_products_display_table.clear()
+
+    def invalidate_receipts_cache(self):
+        """Bump the receipts version counter so cached exports are rebuilt."""
+        st.session_state.receipts_version = st.session_state.get("receipts_version", 0) + 1
+        load_receipts_df.clear()
+        load_receipt_index.clear()
+        build_receipts_csv.clear()
+        build_receipts_excel.clear()
+
     def add_product(self, name, price, stock):
         """Add a new product to the database."""
         try:
             new_product = Product(name=name, price=price, stock=stock)
             self.session.add(new_product)
             self.session.commit()
+            self.invalidate_products_cache()
             st.success(f"Product '{name}' added successfully.")
             logger.info(f"Added new product: {name}, Price: {price}, Stock: {stock}.")
         except Exception as e:
@@ -147,12 +269,13 @@ class Cashier:
     def edit_product(self, product_id, name, price, stock):
         """Edit an existing product in the database."""
         try:
-            product = self.session.query(Product).filter(Product.id == product_id).first()
+            product = self.session.get(Product, product_id)
             if product:
                 product.name = name
                 product.price = price
                 product.stock = stock
                 self.session.commit()
+                self.invalidate_products_cache()
                 st.success(f"Product ID {product_id} updated successfully.")
                 logger.info(f"Updated product ID {product_id}: {name}, Price: {price}, Stock: {stock}.")
             else:
@@ -166,10 +289,11 @@ class Cashier:
     def delete_product(self, product_id):
         """Delete a product from the database."""
         try:
-            product = self.session.query(Product).filter(Product.id == product_id).first()
+            product = self.session.get(Product, product_id)
             if product:
                 self.session.delete(product)
                 self.session.commit()
+                self.invalidate_products_cache()
                 st.success(f"Product ID {product_id} deleted successfully.")
                 logger.info(f"Deleted product ID {product_id}: {product.name}.")
             else:
@@ -183,24 +307,36 @@ class Cashier:
     def add_to_cart(self, cart, product_id, quantity):
         """Add a product to the cart."""
         try:
-            product = self.session.query(Product).filter(Product.id == product_id).first()
+            # Needs current stock, so issue a (cached) SELECT rather than
+            # trusting a possibly stale identity-map entry.
+            product = self.session.execute(PRODUCT_BY_ID, {"pid": product_id}).scalar_one_or_none()
             if product:
                 available_stock = product.stock
                 if quantity > available_stock:
                     return f"Cannot add {quantity} x '{product.name}'. Only {available_stock} in stock."
+                if product_id in cart and cart[product_id]["quantity"] + quantity > available_stock:
+                    return f"Cannot add {quantity} more x '{product.name}'. Only {available_stock - cart[product_id]['quantity']} more can be added."
+                product.stock -= quantity  # Decrement stock
+                self.session.commit()
+                # Mutate the cart and its running total only once the stock
+                # decrement is committed, so a failed commit leaves both
+                # untouched and View Cart stays consistent with its total.
                 if product_id in cart:
-                    if cart[product_id]["quantity"] + quantity > available_stock:
-                        return f"Cannot add {quantity} more x '{product.name}'. Only {available_stock - cart[product_id]['quantity']} more can be added."
                     cart[product_id]["quantity"] += quantity
+                    # The cart keeps the price from first add; use it for the
+                    # running total too, so the figure matches what view_cart
+                    # and checkout compute from the cart entries.
+                    added_value = cart[product_id]["price"] * quantity
                 else:
                     cart[product_id] = {
                         "name": product.name,
                         "price": product.price,
                         "quantity": quantity,
                     }
-                product.stock -= quantity  # Decrement stock
-                self.session.commit()
-                logger.info(f"Added {quantity} x '{product.name}' to the cart.")
+                    added_value = product.price * quantity
+                st.session_state.cart_total = st.session_state.get("cart_total", 0.0) + added_value
+                self.invalidate_products_cache()
+                logger.debug(f"Added {quantity} x '{product.name}' to the cart.")
                 return f"Added {quantity} x '{product.name}' to the cart."
             else:
                 return "Invalid Product ID."
@@ -210,59 +346,89 @@ class Cashier:
             self.session.rollback()
             return "An error occurred while adding to the cart."
 
+    @staticmethod
+    def _cart_arrays(cart):
+        """Extract the cart's prices and quantities as parallel NumPy arrays.
+
+        Structure-of-arrays view of the cart dict: the subtotal/total math
+        then runs as vectorized array ops instead of per-item Python
+        arithmetic.
+        """
+        count = len(cart)
+        prices = np.fromiter((d["price"] for d in cart.values()), dtype=np.float64, count=count)
+        quantities = np.fromiter((d["quantity"] for d in cart.values()), dtype=np.float64, count=count)
+        return prices, quantities
+
     def view_cart(self, cart):
         """Generate a summary of the cart."""
         try:
             if not cart:
                 return None, 0  # No items in the cart
-            total = 0
-            cart_items = []
-            for pid, details in cart.items():
-                subtotal = details["price"] * details["quantity"]
-                total += subtotal
-                cart_items.append(
-                    {
-                        "Product Name": details["name"],
-                        "Quantity": details["quantity"],
-                        "Price ($)": details["price"],
-                        "Subtotal ($)": subtotal,
-                    }
-                )
-            logger.info(f"Viewed cart with total: ${total:.2f}")
+            prices, quantities = self._cart_arrays(cart)
+            subtotals = prices * quantities
+            total = float(subtotals.sum())
+            cart_items = [
+                {
+                    "Product Name": details["name"],
+                    "Quantity": details["quantity"],
+                    "Price ($)": details["price"],
+                    "Subtotal ($)": float(subtotal),
+                }
+                for details, subtotal in zip(cart.values(), subtotals)
+            ]
+            logger.debug(f"Viewed cart with total: ${total:.2f}")
             return cart_items, total
         except Exception as e:
             st.error(f"Error viewing cart: {e}")
             logger.error(f"Error viewing cart: {e}")
             return None, 0
 
+    @staticmethod
+    def _summarize_cart(cart):
+        """Walk the cart once and return a CartSummary.
+
+        checkout and the receipt logging paths previously each re-walked the
+        cart dict to recompute the same values.
+        """
+        total_before = 0
+        summary_parts = []
+        rows = []
+        for details in cart.values():
+            subtotal = details["price"] * details["quantity"]
+            total_before += subtotal
+            summary_parts.append(f"{details['name']} x {details['quantity']}")
+            rows.append((details["name"], details["quantity"], details["price"], subtotal))
+        return CartSummary(total_before, "; ".join(summary_parts), rows)
+
     def apply_package_discounts(self, cart):
         """Apply package discounts to the cart."""
         try:
             savings = 0
             details = []
-            available_quantities = {pid: details["quantity"] for pid, details in cart.items()}
-
-            for package in self.packages:
-                required_products = package["required_products"]
-                discount_amount = package["discount"]
-                package_name = package["name"]
-                times_applicable = float("inf")
-
-                for pid, qty_required in required_products.items():
-                    if pid not in available_quantities or available_quantities[pid] < qty_required:
-                        times_applicable = 0
-                        break
-                    times_applicable = min(times_applicable, available_quantities[pid] // qty_required)
+            # Most carts contain none of the package SKUs; skip the array
+            # work entirely in that case.
+            if not cart or not any(pid in cart for pid in PACKAGE_PIDS):
+                return 0, []
+            # One availability vector covering every product id any package
+            # references; the per-package min/floordiv math runs in NumPy.
+            available = np.array(
+                [cart[pid]["quantity"] if pid in cart else 0 for pid in PACKAGE_PIDS],
+                dtype=np.int64,
+            )
 
+            for package, indices, requirements in zip(
+                PACKAGES, PACKAGE_INDICES, PACKAGE_REQUIREMENTS
+            ):
+                times_applicable = int((available[indices] // requirements).min())
                 if times_applicable > 0:
+                    discount_amount = package["discount"]
                     savings += discount_amount * times_applicable
                     details.append(
-                        f"Applied package '{package_name}' {times_applicable} time(s): -${discount_amount * times_applicable:.2f}"
+                        f"Applied package '{package['name']}' {times_applicable} time(s): -${discount_amount * times_applicable:.2f}"
                     )
-                    for pid, qty_required in required_products.items():
-                        available_quantities[pid] -= qty_required * times_applicable
+                    available[indices] -= requirements * times_applicable
 
-            logger.info(f"Package discounts applied: {details}")
+            logger.debug(f"Package discounts applied: {details}")
             return savings, details
         except Exception as e:
             st.error(f"Error applying package discounts: {e}")
@@ -272,11 +438,11 @@ class Cashier:
     def apply_fixed_discount(self, total):
         """Apply fixed amount discounts based on the total."""
         try:
-            applicable_discounts = [d for d in self.fixed_discounts if total >= d["threshold"]]
-            if not applicable_discounts:
+            i = bisect.bisect_right(DISCOUNT_THRESHOLDS, total) - 1
+            if i < 0:
                 return 0, "No Fixed Discounts Applied."
-            best_discount = max(applicable_discounts, key=lambda x: x["threshold"])
-            logger.info(f"Fixed discount applied: -${best_discount['discount']:.2f}")
+            best_discount = SORTED_DISCOUNTS[i]
+            logger.debug(f"Fixed discount applied: -${best_discount['discount']:.2f}")
             return best_discount["discount"], f"Fixed Discount Applied: -${best_discount['discount']:.2f}"
         except Exception as e:
             st.error(f"Error applying fixed discounts: {e}")
@@ -289,28 +455,28 @@ class Cashier:
             if not cart:
                 return "Your cart is empty.", 0, []
 
-            total_before_discounts = sum(
-                details["price"] * details["quantity"] for details in cart.values()
-            )
-            output = f"Total before discounts: ${total_before_discounts:.2f}\n"
+            total_before_discounts = self._summarize_cart(cart).total_before
+            # Same list-and-join pattern as the receipt text: one allocation
+            # at the end instead of a new string per += step.
+            lines = [f"Total before discounts: ${total_before_discounts:.2f}"]
 
             package_savings, package_details = self.apply_package_discounts(cart)
             total_after_packages = total_before_discounts - package_savings
-            output += f"Package Discounts Savings: -${package_savings:.2f}\n"
-            for detail in package_details:
-                output += detail + "\n"
+            lines.append(f"Package Discounts Savings: -${package_savings:.2f}")
+            lines.extend(package_details)
 
             fixed_discount, fixed_discount_msg = self.apply_fixed_discount(total_after_packages)
             total_after_fixed = total_after_packages - fixed_discount
-            output += fixed_discount_msg + "\n"
+            lines.append(fixed_discount_msg)
 
             coupon_savings = 0
             if apply_coupon:
                 coupon_savings = 5
-                output += f"Coupon Savings: -$5.00\n"
+                lines.append("Coupon Savings: -$5.00")
 
             total_after_coupon = total_after_fixed - coupon_savings
-            output += f"Final Total: ${total_after_coupon:.2f}\n"
+            lines.append(f"Final Total: ${total_after_coupon:.2f}")
+            output = "\n".join(lines) + "\n"
 
             # Collect all discounts for the receipt
             discounts_used = package_details
@@ -319,66 +485,87 @@ class Cashier:
             if apply_coupon:
                 discounts_used.append("Coupon Discount: -$5.00")
 
-            logger.info(f"Checkout summary: Final total - ${total_after_coupon:.2f}")
+            logger.debug(f"Checkout summary: Final total - ${total_after_coupon:.2f}")
             return output, total_after_coupon, discounts_used
         except Exception as e:
             st.error(f"Error during checkout: {e}")
             logger.error(f"Error during checkout: {e}")
             return "An error occurred during checkout.", 0, []
 
-    def log_receipt_to_sqlite(self, cart, total, payment_method, payment_amount, change, discounts_used):
+    def log_receipt_to_sqlite(self, cart, total, payment_method, payment_amount, change, discounts_used, summary=None, now=None):
         """Log the receipt to the SQLite database."""
         try:
-            receipt_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S')  # Unique ID based on timestamp
-            utc_now = datetime.datetime.now(pytz.utc).astimezone(pytz.timezone("Asia/Hong_Kong"))
-            date_obj = utc_now.replace(tzinfo=None)  # Remove timezone info for storage
+            # Reuse the caller's timestamp when provided so one checkout uses
+            # a single clock read.
+            if now is None:
+                now = datetime.datetime.now(HK_TZ)
+            # Random token rather than a second-resolution timestamp: two
+            # checkouts in the same second would collide on the unique
+            # constraint and roll the insert back.
+            receipt_id = uuid.uuid4().hex
+            date_obj = now.replace(tzinfo=None)  # Remove timezone info for storage
 
-            # Create a summary of the products
-            products_summary = "; ".join([f"{details['name']} x {details['quantity']}" for details in cart.values()])
+            # Reuse the caller's cart summary when available instead of
+            # re-walking the cart.
+            if summary is None:
+                summary = self._summarize_cart(cart)
+            total_before_discounts = summary.total_before
+            products_summary = summary.products_summary
 
             # Create a summary of discounts
             discounts_summary = "; ".join(discounts_used) if discounts_used else "None"
 
-            # Calculate total before discounts
-            total_before_discounts = sum(details['price'] * details['quantity'] for details in cart.values())
-
-            # Create a Receipt instance
-            receipt = Receipt(
-                receipt_id=receipt_id,
-                date=date_obj,
-                products=products_summary,
-                total_before_discounts=total_before_discounts,
-                discounts_applied=discounts_summary,
-                final_total=total,
-                payment_method=payment_method,
-                payment_amount=payment_amount,
-                change=change
-            )
-
-            # Add to session and commit
-            self.session.add(receipt)
-            self.session.commit()
+            # Single-row write that is never read back through this session,
+            # so go through Core and skip the ORM unit-of-work machinery.
+            with self.engine.begin() as conn:
+                conn.execute(RECEIPT_INSERT, {
+                    "receipt_id": receipt_id,
+                    "date": date_obj,
+                    "products": products_summary,
+                    "total_before_discounts": total_before_discounts,
+                    "discounts_applied": discounts_summary,
+                    "final_total": total,
+                    "payment_method": payment_method,
+                    "payment_amount": payment_amount,
+                    "change": change
+                })
+            self.invalidate_receipts_cache()
             st.success("Receipt logged successfully in the database.")
             logger.info(f"Receipt {receipt_id} logged successfully.")
         except Exception as e:
-            self.session.rollback()
             st.error(f"Failed to log receipt to the database: {e}")
             logger.error(f"Failed to log receipt: {e}")
 
-    def get_all_receipts(self):
-        """Retrieve all receipts from the database."""
+    def log_receipts_bulk(self, rows):
+        """Insert many receipt rows in one transaction.
+
+        For batch imports and backfills: a single executemany inside one
+        transaction pays one fsync for the whole batch instead of one per
+        row. ``rows`` is an iterable of dicts matching the receipts columns.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
         try:
-            receipts = self.session.query(Receipt).all()
-            return receipts
+            with self.engine.begin() as conn:
+                conn.execute(RECEIPT_INSERT, rows)
+            self.invalidate_receipts_cache()
+            logger.info(f"Bulk-logged {len(rows)} receipts.")
+            return len(rows)
         except Exception as e:
-            st.error(f"Error retrieving receipts: {e}")
-            logger.error(f"Error retrieving receipts: {e}")
-            return []
+            st.error(f"Failed to bulk-log receipts: {e}")
+            logger.error(f"Failed to bulk-log receipts: {e}")
+            return 0
+
+    def edit_receipt(self, receipt_pk, new_payment_method=None, new_payment_amount=None):
+        """Edit an existing receipt's payment method and payment amount.
 
-    def edit_receipt(self, receipt_id, new_payment_method=None, new_payment_amount=None):
-        """Edit an existing receipt's payment method and payment amount."""
+        Receipts are addressed by their integer primary key, which is an
+        identity-map hit when already loaded and an integer B-tree lookup
+        otherwise (faster than the string receipt_id token).
+        """
         try:
-            receipt = self.session.query(Receipt).filter(Receipt.receipt_id == receipt_id).first()
+            receipt = self.session.get(Receipt, receipt_pk)
             if receipt:
                 if new_payment_method:
                     receipt.payment_method = new_payment_method
@@ -387,68 +574,80 @@ class Cashier:
                     # Recalculate change
                     receipt.change = receipt.payment_amount - receipt.final_total
                 self.session.commit()
-                st.success(f"Receipt ID {receipt_id} has been updated successfully.")
-                logger.info(f"Receipt ID {receipt_id} updated: Payment Method - {new_payment_method}, Payment Amount - {new_payment_amount}.")
+                self.invalidate_receipts_cache()
+                st.success(f"Receipt ID {receipt_pk} has been updated successfully.")
+                logger.info(f"Receipt ID {receipt_pk} updated: Payment Method - {new_payment_method}, Payment Amount - {new_payment_amount}.")
             else:
-                st.error(f"No receipt found with ID {receipt_id}.")
-                logger.warning(f"Attempted to edit non-existent receipt ID {receipt_id}.")
+                st.error(f"No receipt found with ID {receipt_pk}.")
+                logger.warning(f"Attempted to edit non-existent receipt ID {receipt_pk}.")
         except Exception as e:
             self.session.rollback()
             st.error(f"Error editing receipt: {e}")
-            logger.error(f"Error editing receipt ID {receipt_id}: {e}")
+            logger.error(f"Error editing receipt ID {receipt_pk}: {e}")
 
-    def delete_receipt(self, receipt_id):
-        """Delete a receipt from the database."""
+    def delete_receipts(self, receipt_pks):
+        """Delete the given receipts in one DELETE ... WHERE id IN (...) statement."""
         try:
-            receipt = self.session.query(Receipt).filter(Receipt.receipt_id == receipt_id).first()
-            if receipt:
-                self.session.delete(receipt)
-                self.session.commit()
-                st.success(f"Receipt ID {receipt_id} deleted successfully.")
-                logger.info(f"Deleted receipt ID {receipt_id}.")
+            deleted = (
+                self.session.query(Receipt)
+                .filter(Receipt.id.in_(receipt_pks))
+                .delete(synchronize_session=False)
+            )
+            self.session.commit()
+            if deleted:
+                self.invalidate_receipts_cache()
+                st.success(f"Deleted {deleted} receipt(s) successfully.")
+                logger.info(f"Deleted {deleted} receipt(s): IDs {list(receipt_pks)}.")
             else:
-                st.error(f"No receipt found with ID {receipt_id}.")
-                logger.warning(f"Attempted to delete non-existent receipt ID {receipt_id}.")
+                st.error("No matching receipts found to delete.")
+                logger.warning(f"Attempted to delete non-existent receipt IDs {list(receipt_pks)}.")
         except Exception as e:
             self.session.rollback()
-            st.error(f"Error deleting receipt: {e}")
-            logger.error(f"Error deleting receipt ID {receipt_id}: {e}")
+            st.error(f"Error deleting receipts: {e}")
+            logger.error(f"Error deleting receipt IDs {list(receipt_pks)}: {e}")
 
     def log_receipt(self, cart, total, payment_method, payment_amount, change, discounts_used):
         """Log the receipt to SQLite and generate receipt content."""
         try:
-            # Generate receipt content for display (optional)
-            utc_now = datetime.datetime.now(pytz.utc).astimezone(pytz.timezone("Asia/Hong_Kong"))
-            receipt_content = f"--- Receipt ---\n"
-            receipt_content += f"Date: {utc_now.strftime('%Y-%m-%d %H:%M:%S')} (UTC+8)\n\n"
+            # One pass over the cart feeds the receipt text, the stored
+            # summary string and the total.
+            summary = self._summarize_cart(cart)
+            total_before_discounts = summary.total_before
+            rows = summary.rows
 
-            receipt_content += "{:<20} {:<10} {:<10} {:<10}\n".format(
-                "Product Name", "Quantity", "Price ($)", "Subtotal ($)"
+            # Generate receipt content for display (optional). Collect the
+            # lines in a list and join once instead of growing a string.
+            utc_now = datetime.datetime.now(HK_TZ)
+            lines = [
+                "--- Receipt ---",
+                f"Date: {utc_now.strftime('%Y-%m-%d %H:%M:%S')} (UTC+8)",
+                "",
+                f"{'Product Name':<20} {'Quantity':<10} {'Price ($)':<10} {'Subtotal ($)':<10}",
+                "-" * 60,
+            ]
+            lines.extend(
+                f"{name:<20} {quantity:<10} {price:<10} {subtotal:<10}"
+                for name, quantity, price, subtotal in rows
             )
-            receipt_content += "-" * 60 + "\n"
-
-            for pid, details in cart.items():
-                subtotal = details["price"] * details["quantity"]
-                receipt_content += "{:<20} {:<10} {:<10} {:<10}\n".format(
-                    details["name"], details["quantity"], details["price"], subtotal
-                )
-
-            receipt_content += "-" * 60 + "\n"
-            receipt_content += f"Total Before Discounts: ${sum(details['price'] * details['quantity'] for details in cart.values()):.2f}\n"
+            lines.append("-" * 60)
+            lines.append(f"Total Before Discounts: ${total_before_discounts:.2f}")
 
             # Include the discounts applied
-            receipt_content += "\n--- Discounts Applied ---\n"
-            for discount in discounts_used:
-                receipt_content += discount + "\n"
+            lines.append("")
+            lines.append("--- Discounts Applied ---")
+            lines.extend(discounts_used)
 
-            receipt_content += f"\nFinal Total: ${total:.2f}\n"
-            receipt_content += f"Payment Method: {payment_method}\n"
-            receipt_content += f"Payment Amount: ${payment_amount:.2f}\n"
-            receipt_content += f"Change: ${change:.2f}\n"
-            receipt_content += "--- Thank You! ---\n\n"
+            lines.append("")
+            lines.append(f"Final Total: ${total:.2f}")
+            lines.append(f"Payment Method: {payment_method}")
+            lines.append(f"Payment Amount: ${payment_amount:.2f}")
+            lines.append(f"Change: ${change:.2f}")
+            lines.append("--- Thank You! ---")
+            lines.append("")
+            receipt_content = "\n".join(lines) + "\n"
 
             # Log to Database
-            self.log_receipt_to_sqlite(cart, total, payment_method, payment_amount, change, discounts_used)
+            self.log_receipt_to_sqlite(cart, total, payment_method, payment_amount, change, discounts_used, summary=summary, now=utc_now)
 
             return receipt_content
         except Exception as e:
@@ -456,25 +655,48 @@ class Cashier:
             logger.error(f"Error logging receipt: {e}")
             return "An error occurred while logging the receipt."
 
+    def _fetch_receipts_df(self):
+        """Read the receipts table straight into a columnar DataFrame.
+
+        pd.read_sql_query streams rows from the DBAPI cursor into numpy
+        arrays, skipping per-row ORM object construction entirely. Only the
+        displayed columns are selected; the surrogate id never leaves SQLite.
+        """
+        stmt = select(
+            Receipt.receipt_id,
+            Receipt.date,
+            Receipt.products,
+            Receipt.total_before_discounts,
+            Receipt.discounts_applied,
+            Receipt.final_total,
+            Receipt.payment_method,
+            Receipt.payment_amount,
+            Receipt.change,
+        )
+        with self.engine.connect() as conn:
+            df = pd.read_sql_query(stmt, conn)
+        if df.empty:
+            return df
+        df["date"] = pd.to_datetime(df["date"]).dt.strftime('%Y-%m-%d %H:%M:%S')
+        return df.rename(columns={
+            "receipt_id": "Receipt ID",
+            "date": "Date",
+            "products": "Products",
+            "total_before_discounts": "Total Before Discounts",
+            "discounts_applied": "Discounts Applied",
+            "final_total": "Final Total",
+            "payment_method": "Payment Method",
+            "payment_amount": "Payment Amount",
+            "change": "Change"
+        })
+
     def get_receipts_dataframe(self):
-        """Convert session receipts to a pandas DataFrame."""
+        """Convert stored receipts to a pandas DataFrame."""
         # For downloading receipts
         try:
-            receipts = self.session.query(Receipt).all()
-            if not receipts:
+            df = self._fetch_receipts_df()
+            if df.empty:
                 return None
-            data = [{
-                "Receipt ID": r.receipt_id,
-                "Date": r.date.strftime('%Y-%m-%d %H:%M:%S'),
-                "Products": r.products,
-                "Total Before Discounts": r.total_before_discounts,
-                "Discounts Applied": r.discounts_applied,
-                "Final Total": r.final_total,
-                "Payment Method": r.payment_method,
-                "Payment Amount": r.payment_amount,
-                "Change": r.change
-            } for r in receipts]
-            df = pd.DataFrame(data)
             return df
         except Exception as e:
             st.error(f"Error converting receipts to DataFrame: {e}")
@@ -484,25 +706,13 @@ class Cashier:
     def view_receipts(self):
         """Display all receipts from the database for debugging."""
         try:
-            receipts = self.session.query(Receipt).all()
-            if receipts:
-                data = [{
-                    "Receipt ID": r.receipt_id,
-                    "Date": r.date.strftime('%Y-%m-%d %H:%M:%S'),
-                    "Products": r.products,
-                    "Total Before Discounts": r.total_before_discounts,
-                    "Discounts Applied": r.discounts_applied,
-                    "Final Total": r.final_total,
-                    "Payment Method": r.payment_method,
-                    "Payment Amount": r.payment_amount,
-                    "Change": r.change
-                } for r in receipts]
-                df = pd.DataFrame(data)
+            df = self._fetch_receipts_df()
+            if not df.empty:
                 st.dataframe(df)
-                logger.info("Displayed all receipts.")
+                logger.debug("Displayed all receipts.")
             else:
                 st.info("No receipts found in the database.")
-                logger.info("No receipts found in the database to display.")
+                logger.debug("No receipts found in the database to display.")
         except Exception as e:
             st.error(f"Failed to retrieve receipts: {e}")
             logger.error(f"Failed to retrieve receipts: {e}")
@@ -513,36 +723,128 @@ st.title("印蛇出動 NF25 & NF58")
 # Initialize session state
 if "cart" not in st.session_state:
     st.session_state.cart = {}
-if "receipts" not in st.session_state:
-    st.session_state.receipts = []
+if "cart_total" not in st.session_state:
+    st.session_state.cart_total = 0.0
+if "products_version" not in st.session_state:
+    st.session_state.products_version = 0
+if "receipts_version" not in st.session_state:
+    st.session_state.receipts_version = 0
+
+# Initialize Cashier once per process; reruns reuse the same engine and
+# session registry instead of reconnecting on every interaction.
+@st.cache_resource
+def get_cashier():
+    return Cashier()
+
+try:
+    cashier = get_cashier()
+except Exception as e:
+    st.error(f"Error setting up the database: {e}")
+    st.stop()
+
+@st.cache_data(show_spinner=False)
+def load_products(version):
+    """Return all products as plain dicts, cached until the version counter changes."""
+    products = cashier.get_all_products()
+    return [{"id": p.id, "name": p.name, "price": p.price, "stock": p.stock} for p in products]
 
-# Initialize Cashier
-cashier = Cashier()
+@st.cache_data(show_spinner=False)
+def load_product_name_map(version):
+    """Product name -> id mapping for the Add to Cart selectbox."""
+    return {p["name"]: p["id"] for p in load_products(version)}
+
+@st.cache_data(show_spinner=False)
+def load_product_options(version):
+    """'Name (ID: n)' label -> id mapping for the Manage Products selectboxes."""
+    return {f"{p['name']} (ID: {p['id']})": p["id"] for p in load_products(version)}
+
+@st.cache_data(show_spinner=False)
+def load_products_display_table(version):
+    """Arrow table of the product catalog for st.dataframe.
+
+    st.dataframe converts whatever it gets to Arrow for transport anyway;
+    building the table directly skips the intermediate pandas DataFrame.
+    """
+    return pa.Table.from_pylist([
+        {"ID": p["id"], "Name": p["name"], "Price ($)": p["price"], "Stock": p["stock"]}
+        for p in load_products(version)
+    ])
+
+@st.cache_data(show_spinner=False)
+def load_receipts_df(version):
+    """Receipts table as a display DataFrame, cached until receipts change."""
+    return cashier._fetch_receipts_df()
+
+@st.cache_data(show_spinner=False)
+def load_receipt_index(version):
+    """Columns the edit/delete forms need, one row per receipt.
+
+    A plain column SELECT rather than hydrating full Receipt objects just
+    to read five attributes each.
+    """
+    rows = cashier.session.execute(
+        select(
+            Receipt.id,
+            Receipt.receipt_id,
+            Receipt.payment_method,
+            Receipt.payment_amount,
+            Receipt.final_total,
+        ).order_by(Receipt.date.desc())
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "receipt_id": row.receipt_id,
+            "payment_method": row.payment_method,
+            "payment_amount": row.payment_amount,
+            "final_total": row.final_total,
+        }
+        for row in rows
+    ]
+
+@st.cache_data(show_spinner=False)
+def build_receipts_csv(version):
+    """Serialize all receipts to CSV bytes, cached until the version counter changes.
+
+    Much cheaper to produce than the Excel workbook when only the raw rows
+    are wanted.
+    """
+    df = cashier.get_receipts_dataframe()
+    if df is None:
+        return None
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+@st.cache_data(show_spinner=False)
+def build_receipts_excel(version):
+    """Serialize all receipts to Excel bytes, cached until the version counter changes.
+
+    No constant_memory here: pandas writes cells column-major, and that
+    mode drops writes to already-flushed rows, mangling every row but the
+    last. The cache keeps the rebuild cost off the rerun path anyway.
+    """
+    df = cashier.get_receipts_dataframe()
+    if df is None:
+        return None
+    towrite = BytesIO()
+    with pd.ExcelWriter(towrite, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False)
+    return towrite.getvalue()
 
 # Sidebar Menu
-menu_options = ["View Products", "Add to Cart", "View Cart", "Checkout", "Manage Products", "View Receipts"]
-menu = st.sidebar.radio("Menu", menu_options)
+menu = st.sidebar.radio("Menu", MENU_OPTIONS)
 
 if menu == "View Products":
     st.header("Available Products")
-    products = cashier.get_all_products()
-    if products:
-        data = [{
-            "ID": p.id,
-            "Name": p.name,
-            "Price ($)": p.price,
-            "Stock": p.stock
-        } for p in products]
-        df = pd.DataFrame(data)
-        st.dataframe(df)
+    products_table = load_products_display_table(st.session_state.products_version)
+    if products_table.num_rows:
+        st.dataframe(products_table)
     else:
         st.info("No products available.")
 
 elif menu == "Add to Cart":
     st.header("Add to Cart")
     # Map product names to IDs for selection
-    products = cashier.get_all_products()
-    product_name_to_id = {p.name: p.id for p in products}
+    product_name_to_id = load_product_name_map(st.session_state.products_version)
     if product_name_to_id:
         product_name = st.selectbox("Select Product", list(product_name_to_id.keys()))
         product_id = product_name_to_id[product_name]
@@ -558,6 +860,7 @@ elif menu == "Add to Cart":
         with col2:
             if st.button("Clear Cart"):
                 st.session_state.cart = {}
+                st.session_state.cart_total = 0.0
                 st.success("Cart has been cleared.")
     else:
         st.warning("No products available to add to cart.")
@@ -569,7 +872,8 @@ elif menu == "View Cart":
         st.warning("Your cart is empty.")
     else:
         st.table(cart_items)
-        st.write(f"Total: ${total:.2f}")
+        # The running total maintained by add_to_cart; O(1) per rerun.
+        st.write(f"Total: ${st.session_state.cart_total:.2f}")
 
 elif menu == "Checkout":
     st.header("Checkout")
@@ -578,7 +882,7 @@ elif menu == "Checkout":
     st.text(checkout_summary)
     
     if final_total > 0:
-        payment_method = st.selectbox("Select Payment Method", ["Cash", "PayMe", "支付寶", "轉數快"])
+        payment_method = st.selectbox("Select Payment Method", PAYMENT_METHODS)
         payment_amount = st.number_input("Enter Payment Amount ($)", min_value=0.0, step=0.01, format="%.2f")
         if st.button("Finalize Payment"):
             if payment_amount >= final_total:
@@ -590,38 +894,37 @@ elif menu == "Checkout":
                 st.info("Receipt:")
                 st.text(receipt_content)
                 st.session_state.cart = {}
+                st.session_state.cart_total = 0.0
                 
                 # Optional: Download Receipts
-                df_receipts = cashier.get_receipts_dataframe()
-                if df_receipts is not None:
-                    towrite = BytesIO()
-                    df_receipts.to_excel(towrite, index=False, engine='openpyxl')
-                    towrite.seek(0)  # Reset pointer
+                excel_bytes = build_receipts_excel(st.session_state.receipts_version)
+                if excel_bytes is not None:
                     st.download_button(
                         label="Download All Receipts as Excel",
-                        data=towrite,
+                        data=excel_bytes,
                         file_name='receipts.xlsx',
                         mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
                     )
+                csv_bytes = build_receipts_csv(st.session_state.receipts_version)
+                if csv_bytes is not None:
+                    st.download_button(
+                        label="Download All Receipts as CSV",
+                        data=csv_bytes,
+                        file_name='receipts.csv',
+                        mime='text/csv'
+                    )
             else:
                 st.error(f"Insufficient payment. You still owe ${final_total - payment_amount:.2f}.")
 
 elif menu == "Manage Products":
     st.header("Manage Products")
-    sub_menu = st.radio("Select Action", ["View Products", "Add Product", "Edit Product", "Delete Product"])
+    sub_menu = st.radio("Select Action", MANAGE_SUBMENU)
     
     if sub_menu == "View Products":
         st.subheader("All Products")
-        products = cashier.get_all_products()
-        if products:
-            data = [{
-                "ID": p.id,
-                "Name": p.name,
-                "Price ($)": p.price,
-                "Stock": p.stock
-            } for p in products]
-            df = pd.DataFrame(data)
-            st.dataframe(df)
+        products_table = load_products_display_table(st.session_state.products_version)
+        if products_table.num_rows:
+            st.dataframe(products_table)
         else:
             st.info("No products available.")
     
@@ -641,18 +944,18 @@ elif menu == "Manage Products":
     
     elif sub_menu == "Edit Product":
         st.subheader("Edit an Existing Product")
-        products = cashier.get_all_products()
+        products = load_products(st.session_state.products_version)
         if products:
-            product_options = {f"{p.name} (ID: {p.id})": p.id for p in products}
+            product_options = load_product_options(st.session_state.products_version)
             selected_product = st.selectbox("Select Product to Edit", list(product_options.keys()))
             selected_product_id = product_options[selected_product]
-            product = cashier.session.query(Product).filter(Product.id == selected_product_id).first()
-            
+            product = next((p for p in products if p["id"] == selected_product_id), None)
+
             if product:
                 with st.form(key="edit_product_form"):
-                    new_name = st.text_input("Product Name", value=product.name)
-                    new_price = st.number_input("Price ($)", min_value=0.0, step=0.1, value=product.price)
-                    new_stock = st.number_input("Stock Quantity", min_value=0, step=1, value=product.stock)
+                    new_name = st.text_input("Product Name", value=product["name"])
+                    new_price = st.number_input("Price ($)", min_value=0.0, step=0.1, value=product["price"])
+                    new_stock = st.number_input("Stock Quantity", min_value=0, step=1, value=product["stock"])
                     submit = st.form_submit_button("Update Product")
                 
                 if submit:
@@ -665,9 +968,8 @@ elif menu == "Manage Products":
     
     elif sub_menu == "Delete Product":
         st.subheader("Delete a Product")
-        products = cashier.get_all_products()
-        if products:
-            product_options = {f"{p.name} (ID: {p.id})": p.id for p in products}
+        product_options = load_product_options(st.session_state.products_version)
+        if product_options:
             selected_product = st.selectbox("Select Product to Delete", list(product_options.keys()))
             selected_product_id = product_options[selected_product]
             confirm_delete = st.checkbox("I confirm that I want to delete this product.")
@@ -681,73 +983,72 @@ elif menu == "Manage Products":
 
 elif menu == "View Receipts":
     st.header("All Receipts")
-    receipts = cashier.get_all_receipts()
-    
-    if receipts:
-        # Display receipts in a table
-        data = [{
-            "Receipt ID": r.receipt_id,
-            "Date": r.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "Products": r.products,
-            "Total Before Discounts": r.total_before_discounts,
-            "Discounts Applied": r.discounts_applied,
-            "Final Total": r.final_total,
-            "Payment Method": r.payment_method,
-            "Payment Amount": r.payment_amount,
-            "Change": r.change
-        } for r in receipts]
-        df = pd.DataFrame(data)
-        st.dataframe(df)
-        
+    receipt_index = load_receipt_index(st.session_state.receipts_version)
+
+    if receipt_index:
+        # Display receipts from the cached columnar read
+        st.dataframe(load_receipts_df(st.session_state.receipts_version))
+
         st.markdown("---")
         st.subheader("Edit a Receipt")
-        
-        # Select Receipt to Edit
-        receipt_ids = [receipt.receipt_id for receipt in receipts]
-        selected_receipt_id = st.selectbox("Select Receipt ID to Edit", receipt_ids)
-        
-        # Fetch the selected receipt
-        selected_receipt = cashier.session.query(Receipt).filter(Receipt.receipt_id == selected_receipt_id).first()
-        
+
+        # Select Receipt to Edit (label shows the receipt token, value is the
+        # integer primary key)
+        receipt_options = {row["receipt_id"]: row["id"] for row in receipt_index}
+        receipts_by_pk = {row["id"]: row for row in receipt_index}
+        selected_receipt_label = st.selectbox("Select Receipt ID to Edit", list(receipt_options.keys()))
+        selected_receipt_pk = receipt_options[selected_receipt_label]
+
+        # The row is already in the cached index; no SELECT per rerun.
+        selected_receipt = receipts_by_pk.get(selected_receipt_pk)
+
         if selected_receipt:
             with st.form(key="edit_receipt_form"):
-                st.write(f"**Editing Receipt ID:** {selected_receipt_id}")
+                st.write(f"**Editing Receipt ID:** {selected_receipt_label}")
                 new_payment_method = st.selectbox(
-                    "Payment Method", 
-                    ["Cash", "PayMe", "支付寶", "轉數快"], 
-                    index=["Cash", "PayMe", "支付寶", "轉數快"].index(selected_receipt.payment_method) if selected_receipt.payment_method in ["Cash", "PayMe", "支付寶", "轉數快"] else 0
+                    "Payment Method",
+                    PAYMENT_METHODS,
+                    index=PAYMENT_METHODS.index(selected_receipt["payment_method"]) if selected_receipt["payment_method"] in PAYMENT_METHODS else 0
                 )
-                new_payment_amount = st.number_input("Payment Amount ($)", min_value=0.0, step=0.01, value=selected_receipt.payment_amount)
+                new_payment_amount = st.number_input("Payment Amount ($)", min_value=0.0, step=0.01, value=selected_receipt["payment_amount"])
                 submit_button = st.form_submit_button("Update Receipt")
-            
+
             if submit_button:
-                if new_payment_amount < selected_receipt.final_total:
-                    st.error(f"Payment amount cannot be less than the final total (${selected_receipt.final_total:.2f}).")
+                if new_payment_amount < selected_receipt["final_total"]:
+                    st.error(f"Payment amount cannot be less than the final total (${selected_receipt['final_total']:.2f}).")
+                elif (new_payment_method == selected_receipt["payment_method"]
+                      and new_payment_amount == selected_receipt["payment_amount"]):
+                    st.info("No changes to save.")
                 else:
                     cashier.edit_receipt(
-                        receipt_id=selected_receipt_id, 
-                        new_payment_method=new_payment_method, 
+                        receipt_pk=selected_receipt_pk,
+                        new_payment_method=new_payment_method,
                         new_payment_amount=new_payment_amount
                     )
-                    
+
                     # Refresh the receipts list
-                    st.experimental_rerun()
+                    st.rerun()
         else:
             st.error("Selected receipt not found.")
         
         st.markdown("---")
-        st.subheader("Delete a Receipt")
-        
+        st.subheader("Delete Receipts")
+
         with st.form(key="delete_receipt_form"):
-            delete_receipt_id = st.selectbox("Select Receipt ID to Delete", receipt_ids)
-            delete_confirm = st.checkbox("I confirm that I want to delete this receipt.")
-            delete_submit = st.form_submit_button("Delete Receipt")
-        
+            delete_receipt_labels = st.multiselect("Select Receipt IDs to Delete", list(receipt_options.keys()))
+            delete_confirm = st.checkbox("I confirm that I want to delete the selected receipts.")
+            delete_submit = st.form_submit_button("Delete Receipts")
+
         if delete_submit:
-            if delete_confirm:
-                cashier.delete_receipt(receipt_id=delete_receipt_id)
-                st.experimental_rerun()
+            if not delete_receipt_labels:
+                st.error("Please select at least one receipt to delete.")
+            elif delete_confirm:
+                cashier.delete_receipts(receipt_pks=[receipt_options[label] for label in delete_receipt_labels])
+                st.rerun()
             else:
                 st.error("Please confirm the deletion by checking the box.")
     else:
         st.info("No receipts found in the database.")
+
+# Return the scoped session now that the page is rendered.
+cashier.close_session()